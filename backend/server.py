@@ -1,17 +1,26 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, BackgroundTasks, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+import asyncio
 import os
+from contextlib import asynccontextmanager
+import hashlib
+import hmac
 import logging
+import time
 from pathlib import Path
+from cachetools import TTLCache
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 import random
 import jwt
+import orjson
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
@@ -20,20 +29,62 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    maxPoolSize=20,
+    minPoolSize=5,
+    serverSelectionTimeoutMS=3000,
+)
 db = client[os.environ['DB_NAME']]
 
 # Environment variables
 SENDGRID_API_KEY = os.environ['SENDGRID_API_KEY']
-ADMIN_EMAIL = os.environ['ADMIN_EMAIL']
+ADMIN_EMAIL = os.environ['ADMIN_EMAIL'].strip().lower()
 JWT_SECRET = os.environ['JWT_SECRET']
 
-# Create the main app
-app = FastAPI()
+# One shared SendGrid client so TLS connections are reused across sends
+sg_client = SendGridAPIClient(SENDGRID_API_KEY)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the independent startup tasks concurrently, close Mongo on exit"""
+    await asyncio.gather(
+        # Force connection establishment now instead of on the first request
+        client.admin.command("ping"),
+        create_indexes(),
+        preload_menu_data(),
+    )
+    yield
+    client.close()
+
+# Create the main app (orjson serializes responses in C, handling datetime
+# and UUID without a jsonable_encoder pass)
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
+# Parse the origin list once at import time. Browsers ignore credentials
+# with a wildcard origin, so only advertise them for an explicit list.
+_cors_origins = [o.strip() for o in os.environ.get('CORS_ORIGINS', '*').split(',') if o.strip()]
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=_cors_origins,
+    allow_credentials=_cors_origins != ['*'],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 security = HTTPBearer()
 
+# Cache of verified JWT tokens keyed by SHA-256 of the raw token, so warm
+# requests skip the HMAC verify + JSON parse. Entries hold (email, exp).
+_jwt_cache = TTLCache(maxsize=1024, ttl=60)
+
+# Raw bearer tokens that already passed the full admin check; the short TTL
+# bounds how long a token is honored without a fresh decode
+_admin_tokens = TTLCache(maxsize=1024, ttl=60)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -46,7 +97,7 @@ logger = logging.getLogger(__name__)
 class MenuItem(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
     category: str
     name: str
     price: float
@@ -91,46 +142,87 @@ class OTPVerification(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
+# Explicit projection so only MenuItem fields come off the wire
+_MENU_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "category": 1,
+    "name": 1,
+    "price": 1,
+    "description": 1,
+    "is_special": 1,
+    "available": 1,
+    "image_url": 1,
+    "created_at": 1,
+}
+
+# Per-worker cache for the public menu endpoints, holding pre-serialized
+# JSON bytes so a hit is a memcpy + socket write. Admin mutations clear it
+# in this process; the TTL covers other workers in multi-worker deployments.
+_MENU_CACHE_TTL = 30
+_menu_cache = {}
+
+def _menu_cache_get(key: str):
+    """Return a cached menu payload, or None if missing/stale"""
+    entry = _menu_cache.get(key)
+    if entry and entry[1] > time.monotonic():
+        return entry[0]
+    return None
+
+def _menu_cache_put(key: str, value):
+    """Cache a menu payload for the TTL window"""
+    _menu_cache[key] = (value, time.monotonic() + _MENU_CACHE_TTL)
+
+def _invalidate_menu_cache():
+    """Drop all cached menu payloads after an admin write"""
+    _menu_cache.clear()
+
 def generate_otp() -> str:
     """Generate 6-digit OTP"""
     return str(random.randint(100000, 999999))
 
-def send_otp_email(email: str, otp: str):
+# Email body is constant apart from the code itself, so build it once
+_OTP_HTML_TEMPLATE = '''
+<div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
+    <h2 style="color: #6B4423;">Café Menu Admin Login</h2>
+    <p>Your OTP for admin login is:</p>
+    <div style="background: #F5E6D3; padding: 20px; text-align: center; border-radius: 8px; margin: 20px 0;">
+        <h1 style="color: #6B4423; font-size: 36px; margin: 0; letter-spacing: 8px;">{{OTP}}</h1>
+    </div>
+    <p>This OTP is valid for 10 minutes.</p>
+    <p style="color: #888; font-size: 14px;">If you didn't request this OTP, please ignore this email.</p>
+</div>
+'''
+
+async def send_otp_email(email: str, otp: str):
     """Send OTP via SendGrid or log to console"""
+    # Runs as a background task after the response is sent, so failures are
+    # logged rather than raised
     try:
         # Log OTP to console for testing
         logger.info(f"="*50)
         logger.info(f"🔐 OTP FOR {email}: {otp}")
         logger.info(f"="*50)
-        
+
         # Try to send via SendGrid
         try:
             message = Mail(
                 from_email='noreply@cafemenu.com',
                 to_emails=email,
                 subject='Your Café Menu Admin OTP',
-                html_content=f'''
-                <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: #6B4423;">Café Menu Admin Login</h2>
-                    <p>Your OTP for admin login is:</p>
-                    <div style="background: #F5E6D3; padding: 20px; text-align: center; border-radius: 8px; margin: 20px 0;">
-                        <h1 style="color: #6B4423; font-size: 36px; margin: 0; letter-spacing: 8px;">{otp}</h1>
-                    </div>
-                    <p>This OTP is valid for 10 minutes.</p>
-                    <p style="color: #888; font-size: 14px;">If you didn't request this OTP, please ignore this email.</p>
-                </div>
-                '''
+                html_content=_OTP_HTML_TEMPLATE.replace("{{OTP}}", otp)
             )
-            sg = SendGridAPIClient(SENDGRID_API_KEY)
-            response = sg.send(message)
+            # The SendGrid SDK is sync/requests-based, so run the HTTPS call
+            # in a thread to keep it off the event loop
+            response = await asyncio.to_thread(sg_client.send, message)
             logger.info(f"OTP email sent to {email}. Status: {response.status_code}")
         except Exception as email_error:
             logger.warning(f"Email sending failed (using console OTP instead): {str(email_error)}")
-        
+
         return True
     except Exception as e:
         logger.error(f"Failed to send OTP: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to send OTP")
+        return False
 
 def create_jwt_token(email: str) -> str:
     """Create JWT token for admin"""
@@ -142,27 +234,46 @@ def create_jwt_token(email: str) -> str:
 
 def verify_jwt_token(token: str) -> str:
     """Verify JWT token and return email"""
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+
+    cached = _jwt_cache.get(cache_key)
+    if cached is not None:
+        email, exp = cached
+        if exp > time.time():
+            return email
+        raise HTTPException(status_code=401, detail="Token has expired")
+
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return payload["email"]
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Only successful decodes are cached so invalid tokens keep raising
+    _jwt_cache[cache_key] = (payload["email"], payload["exp"])
+    return payload["email"]
+
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Dependency to get current admin from JWT token"""
-    email = verify_jwt_token(credentials.credentials)
+    token = credentials.credentials
+    if token in _admin_tokens:
+        return ADMIN_EMAIL
+    email = verify_jwt_token(token)
     if email != ADMIN_EMAIL:
         raise HTTPException(status_code=403, detail="Not authorized")
-    return email
+    _admin_tokens[token] = True
+    return ADMIN_EMAIL
 
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/send-otp")
-async def send_otp(request: SendOTPRequest):
+async def send_otp(request: SendOTPRequest, background: BackgroundTasks):
     """Send OTP to admin email"""
-    if request.email != ADMIN_EMAIL:
+    # Compare case-insensitively and in constant time (bytes, since
+    # compare_digest rejects non-ASCII str and EmailStr allows SMTPUTF8)
+    email = request.email.strip().lower()
+    if not hmac.compare_digest(email.encode(), ADMIN_EMAIL.encode()):
         raise HTTPException(status_code=403, detail="Email not authorized")
     
     # Generate OTP
@@ -170,129 +281,151 @@ async def send_otp(request: SendOTPRequest):
     
     # Store OTP in database
     otp_doc = {
-        "email": request.email,
+        "email": email,
         "otp": otp,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
+        "created_at": datetime.now(timezone.utc),
+        "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10)
     }
     
-    # Delete any existing OTPs for this email
-    await db.otp_verifications.delete_many({"email": request.email})
-    
-    # Insert new OTP
-    await db.otp_verifications.insert_one(otp_doc)
-    
-    # Send email
-    send_otp_email(request.email, otp)
+    # Replace any existing OTP for this email in a single round-trip
+    await db.otp_verifications.replace_one({"email": email}, otp_doc, upsert=True)
     
-    return {"message": "OTP sent successfully", "email": request.email}
+    # Send email after the response goes out, so the SendGrid round-trip
+    # doesn't add to user-visible latency
+    background.add_task(send_otp_email, email, otp)
+
+    return {"message": "OTP sent successfully", "email": email}
 
 @api_router.post("/auth/verify-otp")
 async def verify_otp(request: VerifyOTPRequest):
     """Verify OTP and return JWT token"""
-    if request.email != ADMIN_EMAIL:
+    # Compare case-insensitively and in constant time (bytes, since
+    # compare_digest rejects non-ASCII str and EmailStr allows SMTPUTF8)
+    email = request.email.strip().lower()
+    if not hmac.compare_digest(email.encode(), ADMIN_EMAIL.encode()):
         raise HTTPException(status_code=403, detail="Email not authorized")
     
     # Find OTP in database
-    otp_doc = await db.otp_verifications.find_one({"email": request.email})
+    otp_doc = await db.otp_verifications.find_one({"email": email})
     
     if not otp_doc:
         raise HTTPException(status_code=404, detail="OTP not found or expired")
     
-    # Check if OTP is expired
-    expires_at = datetime.fromisoformat(otp_doc["expires_at"])
-    if datetime.now(timezone.utc) > expires_at:
-        await db.otp_verifications.delete_one({"email": request.email})
+    # Check if OTP is expired (the TTL index cleans up the stale doc)
+    if datetime.now(timezone.utc) > otp_doc["expires_at"]:
         raise HTTPException(status_code=400, detail="OTP has expired")
     
-    # Verify OTP
-    if otp_doc["otp"] != request.otp:
+    # Verify OTP (constant-time compare, as bytes — compare_digest raises
+    # on non-ASCII str and the submitted OTP is an unconstrained string)
+    if not hmac.compare_digest(otp_doc["otp"].encode(), request.otp.encode()):
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
     # Delete OTP after successful verification
-    await db.otp_verifications.delete_one({"email": request.email})
+    await db.otp_verifications.delete_one({"email": email})
     
     # Create JWT token
-    token = create_jwt_token(request.email)
+    token = create_jwt_token(email)
     
-    return {"token": token, "email": request.email}
+    return {"token": token, "email": email}
 
 # ==================== PUBLIC MENU ROUTES ====================
 
-@api_router.get("/menu", response_model=List[MenuItem])
+@api_router.get("/menu")
 async def get_menu():
     """Get all available menu items (public)"""
-    menu_items = await db.menu_items.find({"available": True}, {"_id": 0}).to_list(1000)
-    
-    # Convert ISO string timestamps back to datetime
-    for item in menu_items:
-        if isinstance(item.get('created_at'), str):
-            item['created_at'] = datetime.fromisoformat(item['created_at'])
-    
-    return menu_items
+    cached = _menu_cache_get("items")
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
+    menu_items = await db.menu_items.find(
+        {"available": True}, _MENU_PROJECTION
+    ).sort("category", 1).to_list(None)
+
+    payload = orjson.dumps(menu_items)
+    _menu_cache_put("items", payload)
+    return Response(payload, media_type="application/json")
 
 @api_router.get("/menu/categories")
 async def get_categories():
     """Get all unique categories"""
+    cached = _menu_cache_get("categories")
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
     categories = await db.menu_items.distinct("category")
-    return {"categories": sorted(categories)}
 
-@api_router.get("/menu/specials", response_model=List[MenuItem])
+    payload = orjson.dumps({"categories": sorted(categories)})
+    _menu_cache_put("categories", payload)
+    return Response(payload, media_type="application/json")
+
+@api_router.get("/menu/specials")
 async def get_specials():
     """Get today's special items"""
-    specials = await db.menu_items.find({"is_special": True, "available": True}, {"_id": 0}).to_list(1000)
-    
-    for item in specials:
-        if isinstance(item.get('created_at'), str):
-            item['created_at'] = datetime.fromisoformat(item['created_at'])
-    
-    return specials
+    cached = _menu_cache_get("specials")
+    if cached is not None:
+        return Response(cached, media_type="application/json")
+
+    specials = await db.menu_items.find(
+        {"is_special": True, "available": True}, _MENU_PROJECTION
+    ).sort("category", 1).to_list(None)
+
+    payload = orjson.dumps(specials)
+    _menu_cache_put("specials", payload)
+    return Response(payload, media_type="application/json")
 
 # ==================== ADMIN MENU ROUTES ====================
 
 @api_router.get("/admin/menu", response_model=List[MenuItem])
 async def get_all_menu_items(admin_email: str = Depends(get_current_admin)):
     """Get all menu items including unavailable (admin only)"""
-    menu_items = await db.menu_items.find({}, {"_id": 0}).to_list(1000)
-    
-    for item in menu_items:
-        if isinstance(item.get('created_at'), str):
-            item['created_at'] = datetime.fromisoformat(item['created_at'])
+    menu_items = await db.menu_items.find({}, _MENU_PROJECTION).to_list(None)
     
     return menu_items
 
-@api_router.post("/admin/menu", response_model=MenuItem)
+@api_router.post("/admin/menu")
 async def create_menu_item(item: MenuItemCreate, admin_email: str = Depends(get_current_admin)):
     """Create new menu item (admin only)"""
-    menu_item = MenuItem(**item.model_dump())
-    
-    doc = menu_item.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    # MenuItemCreate already validated the input, so build the insert doc
+    # directly instead of round-tripping through MenuItem
+    doc = item.model_dump()
+    doc["id"] = uuid.uuid4().hex
+    doc["created_at"] = datetime.now(timezone.utc)
+    doc["is_special"] = doc["is_special"] or False
+    doc["available"] = True if doc["available"] is None else doc["available"]
     
     await db.menu_items.insert_one(doc)
-    
-    return menu_item
+
+    _invalidate_menu_cache()
+    # insert_one added the Mongo _id to the dict; drop it before returning
+    doc.pop("_id", None)
+    return doc
 
 @api_router.put("/admin/menu/{item_id}", response_model=MenuItem)
 async def update_menu_item(item_id: str, item: MenuItemUpdate, admin_email: str = Depends(get_current_admin)):
     """Update menu item (admin only)"""
-    existing_item = await db.menu_items.find_one({"id": item_id}, {"_id": 0})
-    
-    if not existing_item:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    
     # Update only provided fields
     update_data = {k: v for k, v in item.model_dump().items() if v is not None}
     
-    if update_data:
-        await db.menu_items.update_one({"id": item_id}, {"$set": update_data})
+    if not update_data:
+        existing_item = await db.menu_items.find_one({"id": item_id}, {"_id": 0})
+        
+        if not existing_item:
+            raise HTTPException(status_code=404, detail="Menu item not found")
+        
+        return MenuItem(**existing_item)
     
-    # Get updated item
-    updated_item = await db.menu_items.find_one({"id": item_id}, {"_id": 0})
+    # Update and fetch the result in a single round-trip
+    updated_item = await db.menu_items.find_one_and_update(
+        {"id": item_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
     
-    if isinstance(updated_item.get('created_at'), str):
-        updated_item['created_at'] = datetime.fromisoformat(updated_item['created_at'])
+    if not updated_item:
+        raise HTTPException(status_code=404, detail="Menu item not found")
     
+    _invalidate_menu_cache()
     return MenuItem(**updated_item)
 
 @api_router.delete("/admin/menu/{item_id}")
@@ -302,43 +435,73 @@ async def delete_menu_item(item_id: str, admin_email: str = Depends(get_current_
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Menu item not found")
-    
+
+    _invalidate_menu_cache()
     return {"message": "Menu item deleted successfully"}
 
 @api_router.put("/admin/menu/{item_id}/toggle-special")
 async def toggle_special(item_id: str, admin_email: str = Depends(get_current_admin)):
     """Toggle special status of menu item"""
-    existing_item = await db.menu_items.find_one({"id": item_id}, {"_id": 0})
-    
-    if not existing_item:
+    # Pipeline update flips the flag atomically in one round-trip
+    updated_item = await db.menu_items.find_one_and_update(
+        {"id": item_id},
+        [{"$set": {"is_special": {"$not": "$is_special"}}}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    
+    if not updated_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
-    new_status = not existing_item.get('is_special', False)
-    await db.menu_items.update_one({"id": item_id}, {"$set": {"is_special": new_status}})
-    
-    return {"message": "Special status updated", "is_special": new_status}
+    _invalidate_menu_cache()
+    return {"message": "Special status updated", "is_special": updated_item["is_special"]}
 
 @api_router.put("/admin/menu/{item_id}/toggle-available")
 async def toggle_available(item_id: str, admin_email: str = Depends(get_current_admin)):
     """Toggle availability of menu item"""
-    existing_item = await db.menu_items.find_one({"id": item_id}, {"_id": 0})
-    
-    if not existing_item:
+    # Pipeline update flips the flag atomically in one round-trip
+    updated_item = await db.menu_items.find_one_and_update(
+        {"id": item_id},
+        [{"$set": {"available": {"$not": "$available"}}}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    
+    if not updated_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
-    new_status = not existing_item.get('available', True)
-    await db.menu_items.update_one({"id": item_id}, {"$set": {"available": new_status}})
-    
-    return {"message": "Availability updated", "available": new_status}
+    _invalidate_menu_cache()
+    return {"message": "Availability updated", "available": updated_item["available"]}
 
-# ==================== PRELOAD MENU DATA ====================
+# ==================== STARTUP TASKS ====================
+
+async def create_indexes():
+    """Create the lookup and TTL indexes used by the menu and OTP paths"""
+    # Point lookups for admin writes and the public menu filters
+    await db.menu_items.create_index("id", unique=True)
+    await db.menu_items.create_index([("available", 1), ("is_special", 1)])
+    await db.menu_items.create_index("category")
+
+    # One OTP per email; let Mongo auto-delete docs once their expiry passes
+    await db.otp_verifications.create_index("email", unique=True)
+    await db.otp_verifications.create_index("expires_at", expireAfterSeconds=0)
 
-@app.on_event("startup")
 async def preload_menu_data():
     """Preload menu items if database is empty"""
     count = await db.menu_items.count_documents({})
     
     if count == 0:
+        # Every gunicorn worker runs this lifespan on a cold boot, so claim
+        # the seed atomically: the upsert inserts the sentinel for exactly
+        # one worker (returning None); the rest see the existing doc
+        sentinel = await db.meta.find_one_and_update(
+            {"_id": "menu_seeded"},
+            {"$setOnInsert": {"seeded_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        if sentinel is not None:
+            return
+        
         logger.info("Preloading menu items...")
         
         menu_data = [
@@ -487,26 +650,12 @@ async def preload_menu_data():
             {"category": "Add Ons", "name": "Extra Sauce", "price": 20, "description": "Extra sauce of your choice"},
         ]
         
-        # Create MenuItem objects and insert
-        for item_data in menu_data:
-            menu_item = MenuItem(**item_data)
-            doc = menu_item.model_dump()
-            doc['created_at'] = doc['created_at'].isoformat()
-            await db.menu_items.insert_one(doc)
+        # Create MenuItem objects and insert in a single batch
+        docs = [MenuItem(**item_data).model_dump() for item_data in menu_data]
+        await db.menu_items.insert_many(docs, ordered=False)
         
+        _invalidate_menu_cache()
         logger.info(f"Preloaded {len(menu_data)} menu items")
 
 # Include the router in the main app
 app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
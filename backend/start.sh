@@ -0,0 +1,18 @@
+#!/bin/sh
+# Production entrypoint: gunicorn managing uvicorn workers, sized 2*cores+1
+# so CPU-bound request phases (JWT verify, JSON serialization) scale across
+# cores instead of serializing on one process's GIL. The in-memory caches in
+# server.py are per-worker; their short TTLs keep workers consistent.
+WORKERS=${WEB_CONCURRENCY:-$((2 * $(nproc) + 1))}
+
+# server:app only resolves from this directory, so don't depend on the
+# caller's cwd
+cd "$(dirname "$0")" || exit 1
+
+# uvloop and httptools are pinned in requirements.txt; uvicorn's "auto"
+# loop/http settings resolve to those C implementations when installed
+exec gunicorn server:app \
+    -k uvicorn.workers.UvicornWorker \
+    --workers "$WORKERS" \
+    --bind 0.0.0.0:"${PORT:-8000}" \
+    --worker-connections 1000
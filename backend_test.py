@@ -1,18 +1,43 @@
-import requests
+import asyncio
+import httpx
+import io
+import orjson
+import re
 import sys
-import json
 import time
-from datetime import datetime
 
 class CafeMenuAPITester:
     def __init__(self, base_url="https://cafedash-2.preview.emergentagent.com"):
         self.base_url = base_url
         self.api_url = f"{base_url}/api"
         self.token = None
+        self.auth_header = None
         self.admin_email = "sana.shaikh0056714@gmail.com"
+        self.session = None
+        self.url_cache = {}
+        self.log_paths = (
+            "/var/log/supervisor/backend.err.log",
+            "/var/log/supervisor/backend.out.log",
+        )
+        # Matches lines like "🔐 OTP FOR email: 123456"; bytes-level so
+        # log tails never need decoding
+        self.otp_pattern = re.compile(
+            rb"OTP FOR " + re.escape(self.admin_email.encode()) + rb"[^\d]{0,8}(\d{6})"
+        )
         self.tests_run = 0
         self.tests_passed = 0
         self.test_results = []
+        self.output_buffer = io.StringIO()
+
+    def say(self, msg=""):
+        """Buffer a progress line instead of writing stdout immediately"""
+        self.output_buffer.write(msg + "\n")
+
+    def flush_output(self):
+        """Write the buffered progress lines to stdout in one go"""
+        sys.stdout.write(self.output_buffer.getvalue())
+        self.output_buffer.truncate(0)
+        self.output_buffer.seek(0)
 
     def log_test(self, name, success, details=""):
         """Log test result"""
@@ -22,12 +47,12 @@ class CafeMenuAPITester:
             status = "✅ PASSED"
         else:
             status = "❌ FAILED"
-        
+
         result = f"{status} - {name}"
         if details:
             result += f" | {details}"
-        
-        print(result)
+
+        self.say(result)
         self.test_results.append({
             "name": name,
             "success": success,
@@ -35,240 +60,238 @@ class CafeMenuAPITester:
         })
         return success
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
+    async def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
         """Run a single API test"""
-        url = f"{self.api_url}/{endpoint}"
-        test_headers = {'Content-Type': 'application/json'}
-        
+        # Repeated endpoints reuse their joined URL
+        url = self.url_cache.get(endpoint)
+        if url is None:
+            url = f"{self.api_url}/{endpoint}"
+            self.url_cache[endpoint] = url
+
+        # Only body-carrying requests need a Content-Type or JSON encoding
+        test_headers = {'Content-Type': 'application/json'} if data is not None else {}
+
         if headers:
             test_headers.update(headers)
-        
-        if self.token and 'Authorization' not in test_headers:
-            test_headers['Authorization'] = f'Bearer {self.token}'
 
-        print(f"\n🔍 Testing {name}...")
-        print(f"   URL: {url}")
-        
-        try:
-            if method == 'GET':
-                response = requests.get(url, headers=test_headers, timeout=30)
-            elif method == 'POST':
-                response = requests.post(url, json=data, headers=test_headers, timeout=30)
-            elif method == 'PUT':
-                response = requests.put(url, json=data, headers=test_headers, timeout=30)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=test_headers, timeout=30)
+        if self.auth_header and 'Authorization' not in test_headers:
+            test_headers['Authorization'] = self.auth_header
 
+        self.say(f"\n🔍 Testing {name}...")
+        self.say(f"   URL: {url}")
+
+        try:
+            body_kwargs = {'json': data} if data is not None else {}
+            response = await self.session.request(
+                method, url, headers=test_headers, **body_kwargs
+            )
             success = response.status_code == expected_status
-            
+
+            # Parse the body once; orjson is several times faster than
+            # stdlib json on the 114-item menu payload
+            body = response.content
+            try:
+                response_data = orjson.loads(body) if body else None
+            except orjson.JSONDecodeError:
+                response_data = None
+
             if success:
                 details = f"Status: {response.status_code}"
-                try:
-                    response_data = response.json()
-                    if isinstance(response_data, list):
-                        details += f" | Items: {len(response_data)}"
-                    elif isinstance(response_data, dict) and 'message' in response_data:
-                        details += f" | {response_data['message']}"
-                except:
-                    pass
+                if isinstance(response_data, list):
+                    details += f" | Items: {len(response_data)}"
+                elif isinstance(response_data, dict) and 'message' in response_data:
+                    details += f" | {response_data['message']}"
             else:
                 details = f"Expected {expected_status}, got {response.status_code}"
-                try:
-                    error_data = response.json()
-                    if 'detail' in error_data:
-                        details += f" | Error: {error_data['detail']}"
-                except:
-                    details += f" | Response: {response.text[:100]}"
+                if isinstance(response_data, dict) and 'detail' in response_data:
+                    details += f" | Error: {response_data['detail']}"
+                elif response_data is None:
+                    details += f" | Response: {body[:100].decode(errors='ignore')}"
 
             self.log_test(name, success, details)
-            return success, response.json() if success else {}
+            return success, response_data if success and response_data is not None else {}
 
         except Exception as e:
             self.log_test(name, False, f"Exception: {str(e)}")
             return False, {}
 
-    def test_public_endpoints(self):
+    async def test_public_endpoints(self):
         """Test all public endpoints"""
         print("\n" + "="*60)
         print("🌐 TESTING PUBLIC ENDPOINTS")
         print("="*60)
-        
-        # Test get menu
-        success, menu_data = self.run_test(
-            "Get Public Menu",
-            "GET",
-            "menu",
-            200
+
+        # The three public GETs are independent, so run them concurrently
+        (menu_result, categories_result, specials_result) = await asyncio.gather(
+            self.run_test("Get Public Menu", "GET", "menu", 200),
+            self.run_test("Get Categories", "GET", "menu/categories", 200),
+            self.run_test("Get Today's Specials", "GET", "menu/specials", 200),
         )
-        
+
+        success, menu_data = menu_result
         if success and menu_data:
             available_items = len(menu_data)
-            print(f"   📊 Found {available_items} available menu items")
-            
+            self.say(f"   📊 Found {available_items} available menu items")
+
             # Check if we have the expected 114 items (some might be unavailable)
             if available_items > 100:
                 self.log_test("Menu Items Count Check", True, f"Found {available_items} items (expected ~114)")
             else:
                 self.log_test("Menu Items Count Check", False, f"Only {available_items} items found, expected ~114")
-        
-        # Test get categories
-        success, categories_data = self.run_test(
-            "Get Categories",
-            "GET",
-            "menu/categories",
-            200
-        )
-        
+
+        success, categories_data = categories_result
         if success and categories_data:
             categories = categories_data.get('categories', [])
-            print(f"   📊 Found {len(categories)} categories: {categories[:5]}...")
-            
-            # Check for expected categories
+            self.say(f"   📊 Found {len(categories)} categories: {categories[:5]}...")
+
+            # Check for expected categories (set lookup instead of
+            # rescanning the list per candidate)
             expected_categories = ['Lassi', 'Falooda', 'Milk Shakes', 'Ice Creams', 'Fresh Juices']
-            found_expected = [cat for cat in expected_categories if cat in categories]
-            if len(found_expected) >= 3:
-                self.log_test("Categories Check", True, f"Found {len(found_expected)}/{len(expected_categories)} expected categories")
+            category_set = set(categories)
+            found_expected = sum(1 for cat in expected_categories if cat in category_set)
+            if found_expected >= 3:
+                self.log_test("Categories Check", True, f"Found {found_expected}/{len(expected_categories)} expected categories")
             else:
-                self.log_test("Categories Check", False, f"Only found {len(found_expected)} expected categories")
-        
-        # Test get specials
-        success, specials_data = self.run_test(
-            "Get Today's Specials",
-            "GET",
-            "menu/specials",
-            200
-        )
-        
+                self.log_test("Categories Check", False, f"Only found {found_expected} expected categories")
+
+        success, specials_data = specials_result
         if success:
             specials_count = len(specials_data)
-            print(f"   📊 Found {specials_count} special items")
+            self.say(f"   📊 Found {specials_count} special items")
 
-    def test_auth_flow(self):
+    async def test_auth_flow(self):
         """Test authentication flow"""
         print("\n" + "="*60)
         print("🔐 TESTING AUTHENTICATION FLOW")
         print("="*60)
-        
+
+        # Snapshot log sizes first: the backend logs the OTP from a
+        # post-response background task, so an older code may still sit in
+        # the tail and only bytes appended after this point can be trusted
+        log_offsets = self.get_log_offsets()
+
         # Test send OTP
-        success, otp_response = self.run_test(
+        success, otp_response = await self.run_test(
             "Send OTP",
             "POST",
             "auth/send-otp",
             200,
             data={"email": self.admin_email}
         )
-        
+
         if not success:
-            print("❌ Cannot proceed with auth tests - OTP sending failed")
+            self.say("❌ Cannot proceed with auth tests - OTP sending failed")
             return False
-        
-        # Wait a moment for OTP to be generated
-        print("⏳ Waiting 3 seconds for OTP to be logged...")
-        time.sleep(3)
-        
-        # Try to get OTP from backend logs
-        otp = self.get_otp_from_logs()
-        
+
+        # Poll for the OTP instead of sleeping a fixed 3 seconds; on a warm
+        # backend it is usually logged within tens of milliseconds
+        self.say("⏳ Polling backend logs for OTP (up to 3s)...")
+        deadline = time.monotonic() + 3.0
+        delay = 0.05
+        otp = None
+        while time.monotonic() < deadline:
+            otp = self.get_otp_from_logs(log_offsets)
+            if otp:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.4)
+
         if not otp:
-            print("❌ Could not retrieve OTP from logs")
+            self.say("❌ Could not retrieve OTP from logs")
             self.log_test("Get OTP from Logs", False, "OTP not found in backend logs")
             return False
-        
+
         self.log_test("Get OTP from Logs", True, f"Found OTP: {otp}")
-        
+
         # Test verify OTP
-        success, verify_response = self.run_test(
+        success, verify_response = await self.run_test(
             "Verify OTP",
             "POST",
             "auth/verify-otp",
             200,
             data={"email": self.admin_email, "otp": otp}
         )
-        
+
         if success and 'token' in verify_response:
             self.token = verify_response['token']
+            # Format the bearer header once instead of on every request
+            self.auth_header = f'Bearer {self.token}'
             self.log_test("JWT Token Generation", True, "Token received and stored")
             return True
         else:
             self.log_test("JWT Token Generation", False, "No token in response")
             return False
 
-    def get_otp_from_logs(self):
+    def get_log_offsets(self):
+        """Snapshot current log sizes so later scans skip existing lines"""
+        offsets = {}
+        for path in self.log_paths:
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(0, 2)
+                    offsets[path] = f.tell()
+            except OSError:
+                offsets[path] = 0
+        return offsets
+
+    def get_otp_from_logs(self, offsets=None):
         """Try to get OTP from backend logs"""
-        try:
-            import subprocess
-            result = subprocess.run(
-                ["tail", "-n", "30", "/var/log/supervisor/backend.err.log"],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            lines = result.stdout.split('\n')
-            for line in reversed(lines):  # Check from newest to oldest
-                if f"OTP FOR {self.admin_email}" in line:
-                    # Extract OTP from line like "🔐 OTP FOR email: 123456"
-                    parts = line.split(':')
-                    if len(parts) >= 2:
-                        otp = parts[-1].strip()
-                        if otp.isdigit() and len(otp) == 6:
-                            return otp
-            
-            # Also check stdout log
-            result = subprocess.run(
-                ["tail", "-n", "30", "/var/log/supervisor/backend.out.log"],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            lines = result.stdout.split('\n')
-            for line in reversed(lines):
-                if f"OTP FOR {self.admin_email}" in line:
-                    parts = line.split(':')
-                    if len(parts) >= 2:
-                        otp = parts[-1].strip()
-                        if otp.isdigit() and len(otp) == 6:
-                            return otp
-                            
-        except Exception as e:
-            print(f"Error reading logs: {e}")
-        
+        for path in self.log_paths:
+            start = offsets.get(path, 0) if offsets else 0
+            try:
+                # Read just the last 8KB of the log directly, no subprocess
+                with open(path, 'rb') as f:
+                    f.seek(0, 2)
+                    size = f.tell()
+                    if start > size:
+                        start = 0  # Log was rotated/truncated
+                    f.seek(max(start, size - 8192))
+                    tail = f.read()
+            except OSError as e:
+                self.say(f"Error reading logs: {e}")
+                continue
+
+            matches = self.otp_pattern.findall(tail)
+            if matches:
+                return matches[-1].decode()  # Newest OTP wins
+
         return None
 
-    def test_admin_endpoints(self):
+    async def test_admin_endpoints(self):
         """Test admin endpoints (requires authentication)"""
         if not self.token:
-            print("❌ No auth token available - skipping admin tests")
+            self.say("❌ No auth token available - skipping admin tests")
             return
-        
+
         print("\n" + "="*60)
         print("👑 TESTING ADMIN ENDPOINTS")
         print("="*60)
-        
+
         # Test get all menu items (admin)
-        success, admin_menu_data = self.run_test(
+        success, admin_menu_data = await self.run_test(
             "Get All Menu Items (Admin)",
             "GET",
             "admin/menu",
             200
         )
-        
+
         if success and admin_menu_data:
             total_items = len(admin_menu_data)
-            available_items = len([item for item in admin_menu_data if item.get('available', True)])
+            # Count without materializing a throwaway list
+            available_items = sum(1 for item in admin_menu_data if item.get('available', True))
             unavailable_items = total_items - available_items
-            
-            print(f"   📊 Total items: {total_items}")
-            print(f"   📊 Available: {available_items}")
-            print(f"   📊 Unavailable: {unavailable_items}")
-            
+
+            self.say(f"   📊 Total items: {total_items}")
+            self.say(f"   📊 Available: {available_items}")
+            self.say(f"   📊 Unavailable: {unavailable_items}")
+
             if total_items >= 114:
                 self.log_test("Total Items Count (Admin)", True, f"Found {total_items} items (expected 114)")
             else:
                 self.log_test("Total Items Count (Admin)", False, f"Only {total_items} items, expected 114")
-        
-        # Test create new menu item
+
+        # Create three independent test items concurrently so the mutation
+        # tests don't serialize on a single item
         test_item = {
             "name": "Test Lassi",
             "category": "Lassi",
@@ -277,140 +300,166 @@ class CafeMenuAPITester:
             "is_special": True,
             "available": True
         }
-        
-        success, create_response = self.run_test(
-            "Create New Menu Item",
-            "POST",
-            "admin/menu",
-            200,
-            data=test_item
-        )
-        
-        created_item_id = None
-        if success and 'id' in create_response:
-            created_item_id = create_response['id']
-            self.log_test("Item Creation Response", True, f"Item ID: {created_item_id}")
-        
-        # Test update menu item
-        if created_item_id:
+
+        create_results = await asyncio.gather(*[
+            self.run_test(
+                f"Create New Menu Item #{i + 1}",
+                "POST",
+                "admin/menu",
+                200,
+                data=test_item
+            )
+            for i in range(3)
+        ])
+
+        created_ids = [
+            create_response['id']
+            for success, create_response in create_results
+            if success and 'id' in create_response
+        ]
+
+        if len(created_ids) == 3:
+            self.log_test("Item Creation Response", True, f"Item IDs: {', '.join(created_ids)}")
+
+            # Each mutation targets its own item, so all three can run at once
             update_data = {
                 "name": "Updated Test Lassi",
                 "price": 60.0,
                 "description": "Updated test item"
             }
-            
-            success, update_response = self.run_test(
-                "Update Menu Item",
-                "PUT",
-                f"admin/menu/{created_item_id}",
-                200,
-                data=update_data
-            )
-            
-            # Test toggle special status
-            success, toggle_response = self.run_test(
-                "Toggle Special Status",
-                "PUT",
-                f"admin/menu/{created_item_id}/toggle-special",
-                200
-            )
-            
-            # Test toggle availability
-            success, toggle_response = self.run_test(
-                "Toggle Availability",
-                "PUT",
-                f"admin/menu/{created_item_id}/toggle-available",
-                200
-            )
-            
-            # Test delete menu item
-            success, delete_response = self.run_test(
-                "Delete Menu Item",
-                "DELETE",
-                f"admin/menu/{created_item_id}",
-                200
+
+            await asyncio.gather(
+                self.run_test(
+                    "Update Menu Item",
+                    "PUT",
+                    f"admin/menu/{created_ids[0]}",
+                    200,
+                    data=update_data
+                ),
+                self.run_test(
+                    "Toggle Special Status",
+                    "PUT",
+                    f"admin/menu/{created_ids[1]}/toggle-special",
+                    200
+                ),
+                self.run_test(
+                    "Toggle Availability",
+                    "PUT",
+                    f"admin/menu/{created_ids[2]}/toggle-available",
+                    200
+                ),
             )
+        else:
+            self.log_test("Item Creation Response", False, f"Only {len(created_ids)}/3 items created")
+
+        # Deletes come last and are mutually independent
+        if created_ids:
+            await asyncio.gather(*[
+                self.run_test(
+                    f"Delete Menu Item #{i + 1}",
+                    "DELETE",
+                    f"admin/menu/{item_id}",
+                    200
+                )
+                for i, item_id in enumerate(created_ids)
+            ])
 
-    def test_error_cases(self):
+    async def test_error_cases(self):
         """Test error handling"""
         print("\n" + "="*60)
         print("⚠️  TESTING ERROR CASES")
         print("="*60)
-        
-        # Test unauthorized access to admin endpoints
-        temp_token = self.token
-        self.token = None  # Remove token temporarily
-        
-        success, _ = self.run_test(
+
+        # Test unauthorized access to admin endpoints (run alone since it
+        # temporarily clears the shared token)
+        temp_auth = self.auth_header
+        self.auth_header = None  # Remove auth temporarily
+
+        success, _ = await self.run_test(
             "Unauthorized Admin Access",
             "GET",
             "admin/menu",
             403
         )
-        
-        self.token = temp_token  # Restore token
-        
-        # Test invalid OTP
-        success, _ = self.run_test(
-            "Invalid OTP Verification",
-            "POST",
-            "auth/verify-otp",
-            404,
-            data={"email": self.admin_email, "otp": "000000"}
-        )
-        
-        # Test invalid email for OTP
-        success, _ = self.run_test(
-            "Invalid Email for OTP",
-            "POST",
-            "auth/send-otp",
-            403,
-            data={"email": "invalid@example.com"}
+
+        self.auth_header = temp_auth  # Restore auth
+
+        # The remaining error cases are independent, so run them concurrently
+        await asyncio.gather(
+            self.run_test(
+                "Invalid OTP Verification",
+                "POST",
+                "auth/verify-otp",
+                404,
+                data={"email": self.admin_email, "otp": "000000"}
+            ),
+            self.run_test(
+                "Invalid Email for OTP",
+                "POST",
+                "auth/send-otp",
+                403,
+                data={"email": "invalid@example.com"}
+            ),
         )
 
     def print_summary(self):
         """Print test summary"""
+        self.flush_output()
         print("\n" + "="*60)
         print("📊 TEST SUMMARY")
         print("="*60)
-        
+
         success_rate = (self.tests_passed / self.tests_run * 100) if self.tests_run > 0 else 0
-        
+
         print(f"Total Tests: {self.tests_run}")
         print(f"Passed: {self.tests_passed}")
         print(f"Failed: {self.tests_run - self.tests_passed}")
         print(f"Success Rate: {success_rate:.1f}%")
-        
+
         if self.tests_run - self.tests_passed > 0:
             print("\n❌ Failed Tests:")
             for result in self.test_results:
                 if not result['success']:
                     print(f"   • {result['name']}: {result['details']}")
-        
+
         return success_rate >= 80  # Consider 80%+ as overall success
 
-def main():
+async def main():
     print("🧪 Starting Café Menu API Tests")
     print("=" * 60)
-    
+
     tester = CafeMenuAPITester()
-    
-    # Run all test suites
-    tester.test_public_endpoints()
-    
-    auth_success = tester.test_auth_flow()
-    
-    if auth_success:
-        tester.test_admin_endpoints()
-    else:
-        print("⚠️  Skipping admin tests due to authentication failure")
-    
-    tester.test_error_cases()
-    
+
+    # One shared HTTP/2 client so concurrent tests multiplex over a single
+    # TLS connection instead of opening one each
+    # Fail fast on a dead host (5s connect) instead of hanging a full 30s
+    async with httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(30, connect=5, read=15),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+    ) as client:
+        tester.session = client
+
+        # Run all test suites, flushing buffered output after each so a
+        # whole suite is one stdout write instead of dozens
+        await tester.test_public_endpoints()
+        tester.flush_output()
+
+        auth_success = await tester.test_auth_flow()
+        tester.flush_output()
+
+        if auth_success:
+            await tester.test_admin_endpoints()
+        else:
+            print("⚠️  Skipping admin tests due to authentication failure")
+        tester.flush_output()
+
+        await tester.test_error_cases()
+
     # Print final summary
     overall_success = tester.print_summary()
-    
+
     return 0 if overall_success else 1
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(asyncio.run(main()))